@@ -4,20 +4,32 @@ A beautiful chat interface for the Finance Agent using Streamlit
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
 import asyncio
+import json
 import os
 import sys
-from datetime import datetime
+import threading
+import time
+import uuid
 
-# Add current directory to path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+@st.cache_resource(show_spinner=False)
+def _bootstrap():
+    """Add current directory to path and load .env - once per process, not on every rerun"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Import finance agent AFTER setting up path
-from finance_agent import run_finance_agent, SQLiteSession
+    from dotenv import load_dotenv
+    load_dotenv()
+    return True
+
+
+_bootstrap()
 
-# Ensure .env is loaded
-from dotenv import load_dotenv
-load_dotenv()
+# Disable tracing for web interface
+os.environ.setdefault('OPENAI_AGENTS_DISABLE_TRACING', '1')
+
+# Import finance agent AFTER setting up path
+from finance_agent import run_finance_agent_stream, SQLiteSession
 
 # ==================== PAGE CONFIGURATION ====================
 
@@ -30,280 +42,90 @@ st.set_page_config(
 
 # ==================== CUSTOM CSS ====================
 
-st.markdown("""
-<style>
-    /* ============================================
-       Finance Agent UI Styles - High Contrast Dark Theme
-       Creator: SHAHAB MALIK
-       ============================================ */
-
-    /* ==================== PAGE BACKGROUND ====================
-       'e8eaed' - Light gray color for the overall page background
-       Yeh poore page ka background color hai (chat area ke bahar wala hissa)
-    */
-    .main {
-        background-color: #e8eaed !important;
-    }
-
-    .main .block-container {
-        background-color: #e8eaed !important;
-        padding: 20px !important;
-    }
-
-    /* ==================== CHAT MESSAGES ====================
-       User aur assistant ke messages ka styling
-    */
-
-    .stChatMessage {
-        background-color: transparent !important;
-        border-radius: 12px;
-        padding: 12px 16px;
-        margin-bottom: 16px;
-    }
-
-    /* USER MESSAGES (Right side) -
-       '4a5568' - Dark gray/slate color for user message background
-       'ffffff' - White text color for readability
-       Messages right side mein appear hote hain
-    */
-    .stChatMessage[data-testid="user-message"] {
-        background-color: #4a5568 !important;
-        color: #ffffff !important;
-        border-radius: 12px;
-        margin-left: auto;
-        max-width: 70%;
-        float: right;
-        clear: both;
-    }
-
-    /* ASSISTANT MESSAGES (Left side) -
-       'ffffff' - Pure white background for AI responses
-       '1a202c' - Very dark text color for contrast
-       'cbd5e0' - Light gray border around messages
-       Messages left side mein appear hote hain
-    */
-    .stChatMessage[data-testid="assistant-message"] {
-        background-color: #ffffff !important;
-        color: #1a202c !important;
-        border: 1px solid #cbd5e0 !important;
-        border-radius: 12px;
-        margin-right: auto;
-        max-width: 85%;
-        float: left;
-        clear: both;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-
-    /* ==================== HEADER SECTION ====================
-       '2d3748' - Dark slate gray background for header
-       'ffffff' - White text for main heading
-       'e2e8f0' - Light gray text for subtext
-       Top heading area "🤖 Finance Agent" wali jagah
-    */
-    .main-header {
-        text-align: center;
-        padding: 24px 20px;
-        background: #2d3748;
-        color: #ffffff;
-        border-radius: 12px;
-        margin-bottom: 24px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-        position: relative;
-    }
-
-    .main-header h1 {
-        color: #ffffff !important;
-        font-size: 28px !important;
-        font-weight: 600 !important;
-        margin-bottom: 8px !important;
-    }
-
-    .main-header p {
-        color: #e2e8f0 !important;
-    }
-
-    /* Creator credit - "Created By: SHAHAB MALIK"
-       'a0aec0' - Muted gray color for creator name
-       Bottom right corner mein appear hota hai
-       Font weight increased to 700 (Bold)
-    */
-    .creator-credit {
-        position: absolute;
-        bottom: 8px;
-        right: 15px;
-        font-size: 13px;
-        color: #ffffff !important;
-        font-weight: 700;
-        text-shadow: 0 1px 2px rgba(0,0,0,0.3);
-    }
-
-    /* ==================== SIDEBAR ====================
-       'ffffff' - White background for sidebar panels
-       '1a202c' - Dark text color
-       'e2e8f0' - Light gray border
-       Left side mein buttons aur settings wali jagah
-    */
-    .sidebar-info {
-        background-color: #ffffff;
-        color: #1a202c;
-        padding: 16px;
-        border-radius: 12px;
-        margin-bottom: 16px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        border: 1px solid #e2e8f0;
-    }
-
-    /* ==================== CHAT INPUT BOX ====================
-       BLACK THEME - Highly visible input area at bottom
-       "Ask your finance question..." wali jagah
-    */
-
-    /* CONTAINER (Bahar ka box) -
-       '1a1a1a' - Almost black color for outer container
-       '000000' - Pure black border (3px thick)
-       Yeh textarea ke bahar ka wrapper box hai
-    */
-    .stChatInputContainer {
-        background-color: #1a1a1a !important;
-        border: 3px solid #000000 !important;
-        border-radius: 12px !important;
-        padding: 12px 16px !important;
-        box-shadow: 0 6px 20px rgba(0, 0, 0, 0.4) !important;
-        margin: 16px 0 !important;
-    }
-
-    /* TEXTAREA (Andar jahan hum type karte hain) -
-       '000000' - Pure black background for typing area
-       'ffffff' - White text color for maximum contrast
-       '333333' - Dark gray border around typing area
-       '15px' - Font size for text
-       Yeh actual input field hai jahan user type karta hai
-    */
-    .stChatInputContainer textarea {
-        background-color: #000000 !important;
-        color: #ffffff !important;
-        border: 2px solid #333333 !important;
-        font-weight: 600 !important;
-        font-size: 15px !important;
-        padding: 10px 12px !important;
-        line-height: 1.5 !important;
-        border-radius: 8px !important;
-    }
-
-    /* FOCUS STATE (Jab user click karta hai) -
-       '0a0a0a' - Even darker black when focused
-       '666666' - Medium gray border when typing
-       White glow effect around input
-    */
-    .stChatInputContainer textarea:focus {
-        background-color: #0a0a0a !important;
-        border-color: #666666 !important;
-        box-shadow: 0 0 0 3px rgba(255, 255, 255, 0.1) !important;
-        outline: none !important;
-    }
-
-    /* PLACEHOLDER TEXT ("Ask your finance question...") -
-       '000000' - Medium gray color for placeholder
-       Placeholder wo text hai jo type se pehle dikhta hai
-    */
-    .stChatInputContainer textarea::placeholder {
-        color: grey !important;
-        font-weight: 600 !important;
-    }
-
-    /* ==================== APP BASE ====================
-       Overall application background
-    */
-    .stApp {
-        background-color: #e8eaed !important;
-    }
-
-    /* ==================== TEXT COLOR FIX ====================
-       Ensure proper text colors in messages
-    */
-    .stChatMessage p {
-        color: inherit !important;
-    }
-
-    /* User message text - White color */
-    .stChatMessage[data-testid="user-message"] p {
-        color: #ffffff !important;
-    }
-
-    /* Assistant message text - Dark color */
-    .stChatMessage[data-testid="assistant-message"] p {
-        color: #1a202c !important;
-    }
-
-    /* ==================== FORCE CSS - MORE SPECIFIC SELECTORS ====================
-       Streamlit ke liye more specific selectors for better CSS application
-    */
-
-    /* Target the input container using data-testid attribute */
-    div[data-testid="stChatInputContainer"] {
-        background-color: #1a1a1a !important;
-        border: 3px solid #000000 !important;
-        border-radius: 12px !important;
-        padding: 12px 16px !important;
-        box-shadow: 0 6px 20px rgba(0, 0, 0, 0.4) !important;
-        margin: 16px 0 !important;
-    }
-
-    div[data-testid="stChatInputContainer"] textarea {
-        background-color: #000000 !important;
-        color: #ffffff !important;
-        border: 2px solid #333333 !important;
-        font-weight: 600 !important;
-        font-size: 15px !important;
-        padding: 10px 12px !important;
-        line-height: 1.5 !important;
-        border-radius: 8px !important;
-    }
-
-    div[data-testid="stChatInputContainer"] textarea:focus {
-        background-color: #0a0a0a !important;
-        border-color: #666666 !important;
-        box-shadow: 0 0 0 3px rgba(255, 255, 255, 0.1) !important;
-        outline: none !important;
-    }
-
-    div[data-testid="stChatInputContainer"] textarea::placeholder {
-        color: #a0a0a0 !important;
-        font-weight: 600 !important;
-    }
-
-    /* ==================== TARGET STREAMLIT CSS CLASSES ====================
-       Streamlit uses internal CSS classes like .st-c5 for textarea background
-       Yeh classes ko directly target kar rahe hain
-    */
-
-    /* .st-c5 is the textarea background class */
-    .st-c5 {
-        background-color: #d3d3d3 !important;
-        background: #d3d3d3 !important;
-    }
-
-    /* Force light gray on all textarea elements */
-    textarea.st-c5,
-    .stChatInputContainer textarea,
-    div[data-testid="stChatInputContainer"] textarea {
-        background-color: #d3d3d3 !important;
-        background: #d3d3d3 !important;
-    }
-
-    /* Target the specific Streamlit input element classes */
-    .st-cj.st-c5 {
-        background-color: #d3d3d3 !important;
-    }
-
-    /* More specific - using combined classes */
-    textarea[data-testid="stChatInputTextArea"] {
-        background-color: #d3d3d3 !important;
-        color: #1a202c !important;
-        border: 2px solid #a0a0a0 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data
+def load_css(path):
+    """Read a stylesheet from disk once and reuse it across reruns"""
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "styles.css")
+
+
+@st.cache_data
+def _css_injection_html(path):
+    """Script that adds the stylesheet to the parent page's <head>"""
+    # Escape "</" so the CSS can never close the surrounding <script> tag
+    css_literal = json.dumps(load_css(path)).replace("</", "<\\/")
+    return f"""
+<script>
+const doc = window.parent.document;
+let style = doc.getElementById("finance-agent-styles");
+if (!style) {{
+    style = doc.createElement("style");
+    style.id = "finance-agent-styles";
+    doc.head.appendChild(style);
+}}
+style.textContent = {css_literal};
+</script>
+"""
+
+
+# Inject the stylesheet once per browser session. A plain st.markdown <style>
+# block would be dropped by Streamlit on any rerun that skipped it, whereas a
+# <style> node added to the parent document stays in place.
+if not st.session_state.get("_css_done"):
+    components.html(_css_injection_html(CSS_PATH), height=0)
+    st.session_state._css_done = True
+
+# ==================== STATIC HTML ====================
+
+@st.cache_data
+def _header_html():
+    return """
+<div class="main-header">
+    <h1>🤖 Finance Agent</h1>
+    <p style='font-size: 14px; margin: 8px 0 0 0;'>Your AI-Powered Financial Assistant</p>
+    <p style='font-size: 13px; margin: 4px 0 0 0; opacity: 0.7;'>
+    Ask about stocks, currency, investments, market news & more!
+    </p>
+    <div class="creator-credit">Created By: SHAHAB MALIK</div>
+</div>
+"""
+
+
+@st.cache_data
+def _welcome_html():
+    return """
+    <div style='text-align: center; padding: 40px; background-color: #f8f9fa; border-radius: 10px; margin-bottom: 20px;'>
+        <h2>👋 Welcome to Finance Agent!</h2>
+        <p style='font-size: 16px; color: #666;'>
+            I can help you with stock prices, currency conversion, portfolio analysis, and market news.<br>
+            Just ask your question below!
+        </p>
+    </div>
+    """
+
+
+@st.cache_data
+def _sidebar_footer_html():
+    return """
+    <div style='text-align: center; font-size: 12px; color: #666;'>
+    Made with ❤️ using<br>
+    OpenAI Agents SDK + Streamlit<br>
+    Powered by Google Gemini via OpenRouter
+    </div>
+    """
+
+
+@st.cache_data
+def _footer_html():
+    return """
+<div style='text-align: center; font-size: 12px; color: #999;'>
+    <p>💡 Tip: I remember our conversation! Ask follow-up questions like "convert that to PKR"</p>
+    <p style='margin-top: 5px;'>Powered by <strong>Google Gemini 2.0 Flash</strong> via OpenRouter (FREE)</p>
+</div>
+"""
 
 # ==================== SIDEBAR ====================
 
@@ -315,7 +137,7 @@ with st.sidebar:
     # Session info
     st.markdown("### 📊 Session Info")
     if "session" not in st.session_state:
-        st.session_state.session = SQLiteSession(f"web_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        st.session_state.session = SQLiteSession(f"web_{uuid.uuid4().hex[:12]}")
     st.success("✅ Session Active")
     st.info(f"🆔 Session: finance_agent_web")
 
@@ -343,35 +165,41 @@ with st.sidebar:
         "Investment calculator"
     ]
 
-    for example in examples:
-        if st.button(example, key=example, use_container_width=True):
+    for i, example in enumerate(examples):
+        if st.button(example, key=f"ex_{i}", use_container_width=True):
             st.session_state.example_question = example
 
     st.markdown("---")
 
     # Clear chat button
     if st.button("🗑️ Clear Chat History", use_container_width=True, type="secondary"):
-        st.session_state.messages = []
+        st.session_state.roles = []
+        st.session_state.contents = []
         st.rerun()
 
     # Footer
     st.markdown("---")
-    st.markdown("""
-    <div style='text-align: center; font-size: 12px; color: #666;'>
-    Made with ❤️ using<br>
-    OpenAI Agents SDK + Streamlit<br>
-    Powered by Google Gemini via OpenRouter
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_sidebar_footer_html(), unsafe_allow_html=True)
 
 # ==================== MAIN AREA ====================
 
 # ==================== ENVIRONMENT CHECK ====================
 
+ENV_VARS = ('OPENAI_API_KEY', 'OPENAI_BASE_URL', 'OPENAI_MODEL')
+
+
+@st.cache_data
+def _env_summary():
+    """Read the agent's environment variables once instead of on every rerun"""
+    return {var: os.getenv(var, '') for var in ENV_VARS}
+
+
+env = _env_summary()
+
 # Check API key first
-api_key = os.getenv('OPENAI_API_KEY', '')
-base_url = os.getenv('OPENAI_BASE_URL', '')
-model_name = os.getenv('OPENAI_MODEL', '')
+api_key = env['OPENAI_API_KEY']
+base_url = env['OPENAI_BASE_URL']
+model_name = env['OPENAI_MODEL']
 
 # Show critical error if API key is missing
 if not api_key:
@@ -408,46 +236,26 @@ with st.expander("🔧 Debug Info", expanded=True):
     # Show environment variables status
     st.markdown("---")
     st.markdown("### 📋 Environment Variables Status:")
-    env_vars = ['OPENAI_API_KEY', 'OPENAI_BASE_URL', 'OPENAI_MODEL']
-    for var in env_vars:
-        value = os.getenv(var, '')
+    for var in ENV_VARS:
+        value = env[var]
         if value:
             st.success(f"✅ `{var}` = {value[:30]}..." if len(value) > 30 else f"✅ `{var}` = {value}")
         else:
             st.error(f"❌ `{var}` = Not set")
 
 # Header
-st.markdown("""
-<div class="main-header">
-    <h1>🤖 Finance Agent</h1>
-    <p style='font-size: 14px; margin: 8px 0 0 0;'>Your AI-Powered Financial Assistant</p>
-    <p style='font-size: 13px; margin: 4px 0 0 0; opacity: 0.7;'>
-    Ask about stocks, currency, investments, market news & more!
-    </p>
-    <div class="creator-credit">Created By: SHAHAB MALIK</div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(_header_html(), unsafe_allow_html=True)
 
-# Initialize chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# Initialize chat history - roles and contents are kept as parallel lists
+st.session_state.setdefault("roles", [])
+st.session_state.setdefault("contents", [])
 
-# Display welcome message if no messages
-if len(st.session_state.messages) == 0:
-    st.markdown("""
-    <div style='text-align: center; padding: 40px; background-color: #f8f9fa; border-radius: 10px; margin-bottom: 20px;'>
-        <h2>👋 Welcome to Finance Agent!</h2>
-        <p style='font-size: 16px; color: #666;'>
-            I can help you with stock prices, currency conversion, portfolio analysis, and market news.<br>
-            Just ask your question below!
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
 
-# Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+def add_message(role: str, content: str) -> None:
+    """Append a message to the chat history"""
+    st.session_state.roles.append(role)
+    st.session_state.contents.append(content)
+
 
 # Chat input - ALWAYS show at the bottom
 user_input = st.chat_input(
@@ -456,131 +264,129 @@ user_input = st.chat_input(
     key="chat_input"
 )
 
-# Handle example question from sidebar (if any)
-# This processes example questions immediately
-if "example_question" in st.session_state and st.session_state.example_question:
-    example_q = st.session_state.example_question
-    del st.session_state.example_question
+# Take the new question (sidebar example or typed input) and add it to the
+# history before rendering, so the history loop displays it exactly once
+example_q = st.session_state.pop("example_question", None)
+pending_query = example_q or user_input
+if pending_query:
+    add_message("user", pending_query)
 
-    # Add user message to chat
-    st.session_state.messages.append({"role": "user", "content": example_q})
+# Display welcome message if no messages
+if not st.session_state.roles:
+    st.markdown(_welcome_html(), unsafe_allow_html=True)
+
+
+# Each new message shifts the archive and creates a new entry holding a full
+# copy of it, so keep only a few recent entries in this process-wide cache
+@st.cache_data(show_spinner=False, max_entries=32, ttl=600)
+def _history_markdown(items):
+    """Join archived (role, content) pairs into one markdown block, cached on their contents"""
+    return "\n\n".join(f"**{role.title()}**: {content}" for role, content in items)
+
+
+# Display chat messages - only the most recent ones unless asked for more
+HISTORY_WINDOW = 50
+roles = st.session_state.roles
+contents = st.session_state.contents
+first_visible = max(len(roles) - HISTORY_WINDOW, 0)
+if first_visible:
+    if st.toggle(f"Show {first_visible} earlier messages", key="show_earlier"):
+        earlier = tuple(zip(roles[:first_visible], contents[:first_visible]))
+        st.markdown(_history_markdown(earlier))
+
+for role, content in zip(roles[first_visible:], contents[first_visible:]):
+    with st.chat_message(role):
+        st.markdown(content)
+
+# ==================== QUERY HANDLING ====================
+
+# Known failure signatures (matched against the lowercased error) and what to tell the user
+ERROR_MESSAGES = (
+    (("402", "token"), "⚠️ **Token Limit Error**: The request was too large. Please try a shorter query."),
+    (("401", "authentication"), "⚠️ **Authentication Error**: Please check your API key in the .env file."),
+    (("429", "rate limit"), "⚠️ **Rate Limit**: Too many requests. Please wait a moment and try again."),
+)
 
-    # Display user message
-    with st.chat_message("user"):
-        st.markdown(example_q)
 
-    # Generate assistant response
-    with st.chat_message("assistant"):
-        with st.spinner("🤔 Thinking..."):
-            try:
-                # Disable tracing for web interface
-                os.environ['OPENAI_AGENTS_DISABLE_TRACING'] = '1'
-
-                # Get response from finance agent
-                response = asyncio.run(
-                    run_finance_agent(example_q, session=st.session_state.session)
-                )
-
-                # Check if response is an error message
-                if "⚠️" in response and ("Token Limit" in response or "API Error" in response):
-                    st.warning(response)
-                else:
-                    # Display response
-                    st.markdown(response)
-
-                # Add to message history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response
-                })
-
-                # Rerun to show updated chat with input still visible
-                st.rerun()
-
-            except Exception as e:
-                error_msg = str(e)
-
-                # Provide helpful error messages
-                if "402" in error_msg or "token" in error_msg.lower():
-                    error_msg = "⚠️ **Token Limit Error**: The request was too large. Please try a shorter query."
-
-                elif "401" in error_msg or "authentication" in error_msg.lower():
-                    error_msg = "⚠️ **Authentication Error**: Please check your API key in the .env file."
-
-                elif "429" in error_msg or "rate limit" in error_msg.lower():
-                    error_msg = "⚠️ **Rate Limit**: Too many requests. Please wait a moment and try again."
-
-                else:
-                    error_msg = f"❌ **Error**: {error_msg}"
-
-                st.error(error_msg)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_msg
-                })
-                st.rerun()
-
-# Process manual user input (if we have one and not from example)
-if user_input:
-    # Add user message to chat
-    st.session_state.messages.append({"role": "user", "content": user_input})
-
-    # Display user message
-    with st.chat_message("user"):
-        st.markdown(user_input)
-
-    # Generate assistant response
+@st.cache_resource
+def get_event_loop():
+    """Start one long-lived event loop in a background thread, shared across reruns"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+async def throttle_stream(src, min_ms=50, min_chars=8):
+    """Coalesce streamed tokens so the UI updates at most ~20 times per second"""
+    buf = ""
+    last = time.monotonic()
+    async for tok in src:
+        buf += tok
+        if len(buf) >= min_chars and (time.monotonic() - last) * 1000 >= min_ms:
+            yield buf
+            buf = ""
+            last = time.monotonic()
+    if buf:
+        yield buf
+
+
+def iter_async(agen, status=None):
+    """
+    Consume an async iterator from the script thread via the shared event loop.
+    While waiting for the first item, an animated indicator is shown in `status`.
+    """
+    loop = get_event_loop()
+    future = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop)
+
+    # The work runs on the loop thread, so this thread is free to animate
+    if status is not None:
+        while not future.done():
+            status.markdown("🤔 Thinking" + "." * (int(time.time() * 2) % 4))
+            time.sleep(0.1)
+        status.empty()
+
+    while True:
+        try:
+            yield future.result()
+        except StopAsyncIteration:
+            return
+        future = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop)
+
+
+def handle_query(q: str) -> None:
+    """Run a user question through the finance agent and record the reply in chat history"""
+    # Generate assistant response, streaming tokens as they arrive
     with st.chat_message("assistant"):
-        with st.spinner("🤔 Thinking..."):
-            try:
-                # Disable tracing for web interface
-                os.environ['OPENAI_AGENTS_DISABLE_TRACING'] = '1'
-
-                # Get response from finance agent
-                response = asyncio.run(
-                    run_finance_agent(user_input, session=st.session_state.session)
-                )
-
-                # Check if response is an error message
-                if "⚠️" in response and ("Token Limit" in response or "API Error" in response):
-                    st.warning(response)
-                else:
-                    # Display response
-                    st.markdown(response)
-
-                # Add to message history
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response
-                })
-
-            except Exception as e:
-                error_msg = str(e)
-
-                # Provide helpful error messages
-                if "402" in error_msg or "token" in error_msg.lower():
-                    error_msg = "⚠️ **Token Limit Error**: The request was too large. Please try a shorter query."
-
-                elif "401" in error_msg or "authentication" in error_msg.lower():
-                    error_msg = "⚠️ **Authentication Error**: Please check your API key in the .env file."
-
-                elif "429" in error_msg or "rate limit" in error_msg.lower():
-                    error_msg = "⚠️ **Rate Limit**: Too many requests. Please wait a moment and try again."
-
-                else:
-                    error_msg = f"❌ **Error**: {error_msg}"
-
-                st.error(error_msg)
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": error_msg
-                })
+        try:
+            # Stream response from finance agent
+            status = st.empty()
+            chunks = throttle_stream(run_finance_agent_stream(q, session=st.session_state.session))
+            response = st.write_stream(iter_async(chunks, status=status))
+
+            # Add to message history
+            add_message("assistant", response)
+
+        except Exception as e:
+            error_msg = str(e)
+
+            # Provide helpful error messages
+            error_lower = error_msg.lower()
+            for needles, message in ERROR_MESSAGES:
+                if any(needle in error_lower for needle in needles):
+                    error_msg = message
+                    break
+            else:
+                error_msg = f"❌ **Error**: {error_msg}"
+
+            st.error(error_msg)
+            add_message("assistant", error_msg)
+
+
+# Answer the new question (if any)
+if pending_query:
+    # The reply streams into place below the history; no rerun needed
+    handle_query(pending_query)
 
 # Footer
 st.markdown("---")
-st.markdown("""
-<div style='text-align: center; font-size: 12px; color: #999;'>
-    <p>💡 Tip: I remember our conversation! Ask follow-up questions like "convert that to PKR"</p>
-    <p style='margin-top: 5px;'>Powered by <strong>Google Gemini 2.0 Flash</strong> via OpenRouter (FREE)</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(_footer_html(), unsafe_allow_html=True)
@@ -7,6 +7,20 @@ import asyncio
 import json
 from finance_agent import run_finance_agent
 
+# Maximum number of agent queries in flight at once (keeps us under provider rate limits)
+MAX_CONCURRENT_QUERIES = 5
+
+
+async def run_queries(queries):
+    """Run independent queries concurrently and return their responses in order."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+    async def run_one(query):
+        async with semaphore:
+            return await run_finance_agent(query)
+
+    return await asyncio.gather(*(run_one(query) for query in queries), return_exceptions=True)
+
 
 async def demonstrate_capabilities():
     """Demonstrate various capabilities of the finance agent."""
@@ -23,9 +37,9 @@ async def demonstrate_capabilities():
         "Analyze Google stock performance (GOOGL)"
     ]
 
-    for query in stock_queries:
+    responses = await run_queries(stock_queries)
+    for query, response in zip(stock_queries, responses):
         print(f"\n❓ Question: {query}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
     # Example 2: Portfolio Analysis
@@ -51,9 +65,9 @@ async def demonstrate_capabilities():
         "What's the CAGR if I turned $5000 into $8000 in 2 years?"
     ]
 
-    for query in returns_queries:
+    responses = await run_queries(returns_queries)
+    for query, response in zip(returns_queries, responses):
         print(f"\n❓ Question: {query}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
     # Example 4: Market Intelligence
@@ -66,9 +80,9 @@ async def demonstrate_capabilities():
         "Latest cryptocurrency news and trends"
     ]
 
-    for query in market_queries:
+    responses = await run_queries(market_queries)
+    for query, response in zip(market_queries, responses):
         print(f"\n❓ Question: {query}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
     # Example 5: Currency & International Markets
@@ -81,9 +95,9 @@ async def demonstrate_capabilities():
         "Currency conversion for international investment analysis"
     ]
 
-    for query in currency_queries:
+    responses = await run_queries(currency_queries)
+    for query, response in zip(currency_queries, responses):
         print(f"\n❓ Question: {query}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
     # Example 6: Risk Assessment
@@ -96,9 +110,9 @@ async def demonstrate_capabilities():
         "Risk analysis for conservative portfolio"
     ]
 
-    for query in risk_queries:
+    responses = await run_queries(risk_queries)
+    for query, response in zip(risk_queries, responses):
         print(f"\n❓ Question: {query}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
     # Example 7: Complex Multi-Part Queries
@@ -117,9 +131,9 @@ async def demonstrate_capabilities():
         """
     ]
 
-    for query in complex_queries:
+    responses = await run_queries(complex_queries)
+    for query, response in zip(complex_queries, responses):
         print(f"\n❓ Complex Question: {query.strip()}")
-        response = await run_finance_agent(query)
         print(f"📝 Answer: {response}")
 
 
@@ -136,16 +150,18 @@ async def quick_test():
         "Assess risk with beta 1.1, volatility 15%, diversification 8"
     ]
 
-    for i, query in enumerate(test_cases, 1):
+    responses = await run_queries(test_cases)
+    for i, (query, response) in enumerate(zip(test_cases, responses), 1):
         print(f"\nTest {i}/{len(test_cases)}: {query}")
-        try:
-            response = await run_finance_agent(query)
-            if response and len(str(response)) > 0:
-                print(f"✅ Success: {str(response)[:100]}...")
-            else:
-                print(f"❌ No response")
-        except Exception as e:
-            print(f"❌ Error: {str(e)}")
+        if isinstance(response, Exception):
+            print(f"❌ Error: {str(response)}")
+            continue
+
+        text = str(response) if response else ""
+        if text:
+            print(f"✅ Success: {text[:100]}...")
+        else:
+            print(f"❌ No response")
 
 
 async def financial_planning_scenario():
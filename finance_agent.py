@@ -8,19 +8,28 @@ Model: google/gemini-2.0-flash-exp:free
 """
 
 import asyncio
+import functools
 import json
+import math
 import os
 import random
+import re
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Annotated, List, Dict, Any, Optional
-from pydantic import BaseModel, Field
+from types import MappingProxyType
+from typing import Annotated, List, Dict, Any, AsyncIterator, Mapping, Optional, Tuple
+from pydantic import BaseModel, Field, field_serializer
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-from agents import Agent, Runner, function_tool, Handoff, SQLiteSession
+from agents import Agent, ModelSettings, Runner, function_tool, Handoff, SQLiteSession, set_default_openai_client
 from agents.extensions.handoff_prompt import prompt_with_handoff_instructions
+from openai import RateLimitError
+from openai.types.responses import ResponseTextDeltaEvent
 
 
 # ==================== OPENROUTER + GOOGLE AI CONFIGURATION ====================
@@ -34,19 +43,41 @@ OPENROUTER_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1
 # More info: https://openrouter.ai/models?free=true
 DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "google/gemini-2.0-flash-exp:free")
 
+# Model settings for OpenRouter with FREE tier compatibility, shared by every agent
+MODEL_SETTINGS = ModelSettings(
+    model=DEFAULT_MODEL,
+    base_url=OPENROUTER_BASE_URL,
+    api_key=OPENROUTER_API_KEY,
+    max_tokens=2000  # Reduced for stability with free tier
+)
+
+@functools.lru_cache(maxsize=1)
 def get_openai_client():
-    """Create an OpenAI client configured for OpenRouter with Google AI models"""
-    from openai import OpenAI
+    """
+    Get the shared AsyncOpenAI client configured for OpenRouter with Google AI models.
+    One client means one connection pool, so keep-alive connections are reused across calls.
+    """
+    from openai import AsyncOpenAI
 
-    return OpenAI(
-        api_key=OPENROUTER_API_KEY,
-        base_url=OPENROUTER_BASE_URL
-    )
+    return AsyncOpenAI(api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL)
 
 
 # ==================== FINANCIAL DATA MODELS ====================
 
-class StockPrice(BaseModel):
+class ToolResult(BaseModel):
+    """Base for tool return values, rendered as compact JSON when sent to the model"""
+
+    def __str__(self) -> str:
+        # The Agents SDK passes tool output to the model as str(result);
+        # model_dump_json serializes in pydantic-core rather than Python repr code
+        return self.model_dump_json()
+
+    def __repr_args__(self):
+        # Lists of results reach the model via repr(), so show serialized values there too
+        return self.model_dump().items()
+
+
+class StockPrice(ToolResult):
     """Stock price information"""
     symbol: str = Field(description="Stock ticker symbol")
     price: float = Field(description="Current price")
@@ -54,16 +85,24 @@ class StockPrice(BaseModel):
     change_percent: float = Field(description="Percentage change")
     timestamp: str = Field(description="Timestamp of the data")
 
+    @field_serializer("price", "change", "change_percent")
+    def round_to_cents(self, value: float) -> float:
+        return round(value, 2)
 
-class PortfolioSummary(BaseModel):
+
+class PortfolioSummary(ToolResult):
     """Portfolio performance summary"""
     total_value: float = Field(description="Total portfolio value")
     total_gain_loss: float = Field(description="Total gain/loss amount")
     gain_loss_percent: float = Field(description="Percentage gain/loss")
     num_positions: int = Field(description="Number of positions")
 
+    @field_serializer("total_value", "total_gain_loss", "gain_loss_percent")
+    def round_to_cents(self, value: float) -> float:
+        return round(value, 2)
+
 
-class MarketNews(BaseModel):
+class MarketNews(ToolResult):
     """Market news item"""
     headline: str = Field(description="News headline")
     source: str = Field(description="News source")
@@ -71,13 +110,17 @@ class MarketNews(BaseModel):
     summary: str = Field(description="Brief summary of the news")
 
 
-class FinancialAnalysis(BaseModel):
+class FinancialAnalysis(ToolResult):
     """Financial analysis result"""
     metric: str = Field(description="Metric being analyzed")
     value: float = Field(description="Metric value")
     interpretation: str = Field(description="Interpretation of the metric")
     recommendation: str = Field(description="Recommendation based on analysis")
 
+    @field_serializer("value")
+    def round_to_cents(self, value: float) -> float:
+        return round(value, 2)
+
 
 class PortfolioHolding(BaseModel):
     """Individual portfolio holding"""
@@ -86,11 +129,60 @@ class PortfolioHolding(BaseModel):
     average_cost: float = Field(description="Average cost per share")
 
 
+# ==================== CACHING ====================
+
+# How long upstream data stays fresh, in seconds
+STOCK_PRICE_TTL = 60
+MARKET_NEWS_TTL = 5 * 60
+EXCHANGE_RATE_TTL = 24 * 60 * 60
+
+
+def ttl_cache(ttl_seconds: float, maxsize: int = 1024):
+    """Cache a function's results per positional-argument tuple for ttl_seconds."""
+    def decorator(func):
+        cache: Dict[Any, Any] = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            entry = cache.get(args)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+            value = func(*args)
+            # Re-insert so dict order stays oldest-first
+            cache.pop(args, None)
+            if len(cache) >= maxsize:
+                # Drop expired entries before growing further
+                for key in [key for key, (expiry, _) in cache.items() if expiry <= now]:
+                    del cache[key]
+                # Still full of fresh entries: evict the oldest
+                while len(cache) >= maxsize:
+                    del cache[next(iter(cache))]
+            cache[args] = (now + ttl_seconds, value)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=1)
+def _iso_second(bucket: int) -> str:
+    """ISO-8601 timestamp for a whole epoch second, reused for every call within it."""
+    return datetime.fromtimestamp(bucket).isoformat(timespec='seconds')
+
+
+def now_iso() -> str:
+    """Current local time as an ISO-8601 string at one-second resolution."""
+    return _iso_second(int(time.time()))
+
+
 # ==================== FINANCIAL TOOLS ====================
 
-@function_tool
-def get_stock_price(symbol: Annotated[str, "Stock ticker symbol (e.g., AAPL, GOOGL)"]) -> StockPrice:
-    """Get current stock price and recent performance for any stock symbol."""
+@ttl_cache(STOCK_PRICE_TTL)
+def _simulate_stock_price(symbol: str) -> StockPrice:
+    """Generate simulated stock data for an upper-case symbol."""
     # Simulate fetching stock data (in production, use a real API like Alpha Vantage, Yahoo Finance)
     base_price = random.uniform(50, 500)
     change = random.uniform(-10, 10)
@@ -98,19 +190,37 @@ def get_stock_price(symbol: Annotated[str, "Stock ticker symbol (e.g., AAPL, GOO
 
     return StockPrice(
         symbol=symbol.upper(),
-        price=round(base_price, 2),
-        change=round(change, 2),
-        change_percent=round(change_percent, 2),
-        timestamp=datetime.now().isoformat()
+        price=base_price,
+        change=change,
+        change_percent=change_percent,
+        timestamp=now_iso()
     )
 
 
+async def aget_stock_prices(symbols: List[str]) -> List[StockPrice]:
+    """Fetch quotes for several symbols in one batched upstream request."""
+    # In production this would be a single multi-symbol call (e.g. a batch quote endpoint)
+    # awaited on an async HTTP client such as httpx.AsyncClient
+    return [_simulate_stock_price(symbol.upper()) for symbol in symbols]
+
+
 @function_tool
-def get_market_news(
-    category: Annotated[str, "Market category (stocks, crypto, economy, tech)"] = "stocks",
-    limit: Annotated[int, "Number of news items to return"] = 5
-) -> List[MarketNews]:
-    """Get latest market news and financial updates."""
+def get_stock_price(symbol: Annotated[str, "Stock ticker symbol (e.g., AAPL, GOOGL)"]) -> StockPrice:
+    """Get current stock price and recent performance for any stock symbol."""
+    return _simulate_stock_price(symbol.upper())
+
+
+@function_tool
+def get_stock_prices(
+    symbols: Annotated[List[str], "Stock ticker symbols (e.g., [\"AAPL\", \"GOOGL\"])"]
+) -> List[StockPrice]:
+    """Get current stock prices for several stock symbols in one call."""
+    return [_simulate_stock_price(symbol.upper()) for symbol in symbols]
+
+
+@ttl_cache(MARKET_NEWS_TTL)
+def _fetch_market_news(category: str, limit: int) -> List[MarketNews]:
+    """Generate simulated news items for a category."""
     categories = {
         "stocks": ["Stock Market", "Equities", "Wall Street"],
         "crypto": ["Cryptocurrency", "Bitcoin", "DeFi"],
@@ -120,47 +230,51 @@ def get_market_news(
 
     sources = ["Bloomberg", "Reuters", "CNBC", "Financial Times", "MarketWatch"]
 
-    news_items = []
-    for i in range(limit):
-        category_name = random.choice(categories.get(category, ["Market"]))
-        source = random.choice(sources)
+    # Draw all random values in bulk and read the clock once
+    category_names = random.choices(categories.get(category, ["Market"]), k=limit)
+    item_sources = random.choices(sources, k=limit)
+    hours_ago = [random.randint(0, 24) for _ in range(limit)]
+    now = datetime.now()
 
-        news_items.append(MarketNews(
+    return [
+        MarketNews(
             headline=f"{category_name} Update: Market analysis and insights {i+1}",
             source=source,
-            timestamp=(datetime.now() - timedelta(hours=random.randint(0, 24))).isoformat(),
+            timestamp=(now - timedelta(hours=hours)).isoformat(timespec='seconds'),
             summary=f"Analysis of {category_name.lower()} trends and market movements. Expert opinions on future direction."
-        ))
+        )
+        for i, (category_name, source, hours) in enumerate(zip(category_names, item_sources, hours_ago))
+    ]
 
-    return news_items
+
+@function_tool
+def get_market_news(
+    category: Annotated[str, "Market category (stocks, crypto, economy, tech)"] = "stocks",
+    limit: Annotated[int, "Number of news items to return"] = 5
+) -> List[MarketNews]:
+    """Get latest market news and financial updates."""
+    return list(_fetch_market_news(category.lower(), limit))
 
 
 @function_tool
-def analyze_portfolio(
+async def analyze_portfolio(
     holdings: Annotated[List[PortfolioHolding], "List of portfolio holdings"]
 ) -> PortfolioSummary:
     """Analyze portfolio performance and calculate metrics."""
-    total_value = 0
-    total_cost = 0
+    # Get current prices for all holdings in one request (in production, would fetch real data)
+    quotes = await aget_stock_prices([holding.symbol for holding in holdings])
+    prices = [quote.price for quote in quotes]
 
-    for holding in holdings:
-        symbol = holding.symbol.upper()
-        shares = holding.shares
-        avg_cost = holding.average_cost
-
-        # Get current price (in production, would fetch real data)
-        current_price = get_stock_price(symbol).price
-
-        total_cost += shares * avg_cost
-        total_value += shares * current_price
+    total_cost = sum(holding.shares * holding.average_cost for holding in holdings)
+    total_value = sum(holding.shares * price for holding, price in zip(holdings, prices))
 
     total_gain_loss = total_value - total_cost
     gain_loss_percent = (total_gain_loss / total_cost * 100) if total_cost > 0 else 0
 
     return PortfolioSummary(
-        total_value=round(total_value, 2),
-        total_gain_loss=round(total_gain_loss, 2),
-        gain_loss_percent=round(gain_loss_percent, 2),
+        total_value=total_value,
+        total_gain_loss=total_gain_loss,
+        gain_loss_percent=gain_loss_percent,
         num_positions=len(holdings)
     )
 
@@ -176,7 +290,9 @@ def calculate_returns(
     total_return_percent = (total_return / initial_investment) * 100
 
     # Calculate CAGR (Compound Annual Growth Rate)
-    cagr = ((final_value / initial_investment) ** (1 / period_years) - 1) * 100
+    # expm1(log(ratio) / years) is (ratio ** (1 / years) - 1) without losing precision near 1
+    ratio = final_value / initial_investment
+    cagr = math.expm1(math.log(ratio) / period_years) * 100 if ratio > 0 else -100.0
 
     interpretation = f"Your investment grew by {total_return_percent:.2f}% over {period_years} years. "
 
@@ -189,12 +305,37 @@ def calculate_returns(
 
     return FinancialAnalysis(
         metric="CAGR",
-        value=round(cagr, 2),
+        value=cagr,
         interpretation=interpretation + f"Annualized return: {cagr:.2f}%",
         recommendation=recommendation
     )
 
 
+# Simulated USD-based exchange rates
+# Rates as of January 2025
+_FX_RATES = MappingProxyType({
+    "USD": 1.0,
+    "EUR": 0.92,
+    "GBP": 0.79,
+    "JPY": 149.50,
+    "CAD": 1.35,
+    "AUD": 1.52,
+    "CHF": 0.88,
+    "PKR": 278.50,  # Pakistani Rupee
+    "INR": 83.12,   # Indian Rupee
+    "CNY": 7.24,    # Chinese Yuan
+    "AED": 3.67,    # UAE Dirham
+    "SAR": 3.75     # Saudi Riyal
+})
+
+
+@ttl_cache(EXCHANGE_RATE_TTL)
+def _get_exchange_rates() -> Mapping[str, float]:
+    """Get USD-based exchange rates for supported currencies."""
+    # Simulate exchange rates (in production, use real exchange rate API)
+    return _FX_RATES
+
+
 @function_tool
 def currency_converter(
     amount: Annotated[float, "Amount to convert"],
@@ -202,32 +343,22 @@ def currency_converter(
     to_currency: Annotated[str, "Target currency (USD, EUR, GBP, JPY, PKR, etc.)"]
 ) -> FinancialAnalysis:
     """Convert between different currencies with current exchange rates."""
-    # Simulate exchange rates (in production, use real exchange rate API)
-    # Rates as of January 2025
-    exchange_rates = {
-        "USD": 1.0,
-        "EUR": 0.92,
-        "GBP": 0.79,
-        "JPY": 149.50,
-        "CAD": 1.35,
-        "AUD": 1.52,
-        "CHF": 0.88,
-        "PKR": 278.50,  # Pakistani Rupee
-        "INR": 83.12,   # Indian Rupee
-        "CNY": 7.24,    # Chinese Yuan
-        "AED": 3.67,    # UAE Dirham
-        "SAR": 3.75     # Saudi Riyal
-    }
+    from_code = from_currency.upper()
+    to_code = to_currency.upper()
 
-    from_rate = exchange_rates.get(from_currency.upper(), 1.0)
-    to_rate = exchange_rates.get(to_currency.upper(), 1.0)
+    exchange_rates = _get_exchange_rates()
+    from_rate = exchange_rates.get(from_code, 1.0)
+    to_rate = exchange_rates.get(to_code, 1.0)
 
-    converted_amount = (amount / from_rate) * to_rate
+    if from_code == to_code:
+        converted_amount = amount
+    else:
+        converted_amount = amount / from_rate * to_rate
 
     return FinancialAnalysis(
         metric="Currency Conversion",
-        value=round(converted_amount, 2),
-        interpretation=f"{amount} {from_currency.upper()} = {converted_amount:.2f} {to_currency.upper()}",
+        value=converted_amount,
+        interpretation=f"{amount} {from_code} = {converted_amount:.2f} {to_code}",
         recommendation=f"Conversion rate: {1/from_rate:.4f} {from_currency}/USD, {to_rate:.4f} {to_currency}/USD"
     )
 
@@ -271,17 +402,6 @@ def risk_assessment(
 
 # ==================== SPECIALIZED AGENTS ====================
 
-# Create model settings for OpenRouter with Google AI
-def create_model_settings():
-    """Create ModelSettings for OpenRouter with FREE tier compatibility"""
-    from agents import ModelSettings
-    return ModelSettings(
-        model=DEFAULT_MODEL,
-        base_url=OPENROUTER_BASE_URL,
-        api_key=OPENROUTER_API_KEY,
-        max_tokens=2000  # Reduced for stability with free tier
-    )
-
 # Stock Analysis Agent
 stock_agent = Agent(
     name="Stock Analyst",
@@ -289,13 +409,14 @@ stock_agent = Agent(
     instructions=(
         "You are a professional stock analyst. Provide detailed analysis of individual stocks, "
         "including price trends, fundamental metrics, and investment recommendations. "
-        "Always use the get_stock_price tool for current data and provide thoughtful analysis.\n\n"
+        "Always use the get_stock_price tool for current data (or get_stock_prices to look up "
+        "several symbols at once) and provide thoughtful analysis.\n\n"
         "IMPORTANT: Always provide calculations clearly. If user mentions previous calculations "
         "or wants to convert values to other currencies, explicitly acknowledge the amount and "
         "suggest using the currency specialist if needed."
     ),
-    tools=[get_stock_price],
-    model_settings=create_model_settings()
+    tools=[get_stock_price, get_stock_prices],
+    model_settings=MODEL_SETTINGS
 )
 
 # Portfolio Management Agent
@@ -308,7 +429,7 @@ portfolio_agent = Agent(
         "calculate_returns tools for comprehensive analysis."
     ),
     tools=[analyze_portfolio, calculate_returns, risk_assessment],
-    model_settings=create_model_settings()
+    model_settings=MODEL_SETTINGS
 )
 
 # Market Intelligence Agent
@@ -320,7 +441,7 @@ market_agent = Agent(
         "Use get_market_news tool to fetch current information and provide context-rich analysis."
     ),
     tools=[get_market_news],
-    model_settings=create_model_settings()
+    model_settings=MODEL_SETTINGS
 )
 
 # Currency and Global Markets Agent
@@ -339,7 +460,7 @@ currency_agent = Agent(
         "Always show the calculation clearly."
     ),
     tools=[currency_converter],
-    model_settings=create_model_settings()
+    model_settings=MODEL_SETTINGS
 )
 
 # ==================== TRIAGE AGENT ====================
@@ -356,7 +477,22 @@ triage_agent = Agent(
         "CRITICAL: You MUST handoff to the appropriate specialist. Do NOT answer questions yourself."
     ),
     handoffs=[stock_agent, portfolio_agent, market_agent, currency_agent],
-    model_settings=create_model_settings()
+    model_settings=MODEL_SETTINGS
+)
+
+# ==================== SYNTHESIZER AGENT ====================
+
+# Number of parallel specialist answers at which they get merged into a single reply
+SYNTHESIS_MIN_AGENTS = 3
+
+synthesizer_agent = Agent(
+    name="Finance Synthesizer",
+    instructions=(
+        "You combine answers from several financial specialists into one clear response. "
+        "Keep every figure and calculation from the specialists, remove repetition, "
+        "and answer the user's original question directly."
+    ),
+    model_settings=MODEL_SETTINGS
 )
 
 
@@ -412,90 +548,383 @@ def configure_openai_client():
 
 # ==================== MAIN EXECUTION ====================
 
-async def run_finance_agent(query: str, session: SQLiteSession = None):
-    """Main function to run the finance agent with a user query."""
+def setup_provider():
+    """
+    Configure the OpenAI SDK for whichever provider the API key belongs to.
+    Returns False when no API key is available.
+    """
+    api_key, provider = get_api_key()
+    if not api_key:
+        return False
+
+    # Configure client based on provider
+    if provider == "openrouter":
+        # Configure for OpenRouter (Google Gemini via OpenRouter)
+        configure_openai_client()
+    elif provider == "google":
+        # Google key via OpenRouter
+        configure_openai_client()
+    elif provider == "openai":
+        # Direct OpenAI API
+        os.environ["OPENAI_API_KEY"] = api_key
+
+    # Route every agent call through the shared client and its connection pool
+    set_default_openai_client(get_openai_client(), use_for_tracing=False)
+
+    return True
+
+
+# Math/calculation keywords
+MATH_KW = frozenset({'subtract', 'add', 'multiply', 'divide', 'percent', '%', 'calculate'})
+
+# Stock-related keywords
+STOCK_KW = frozenset({'stock', 'price', 'aapl', 'googl', 'tsla', 'nvda', 'msft', 'amzn',
+                      'meta', 'ticker', 'shares', 'equity', 'analysis'})
+
+# Portfolio-related keywords
+PORTFOLIO_KW = frozenset({'portfolio', 'investment', 'returns', 'risk', 'diversification',
+                          'holdings', 'asset', 'allocation'})
+
+# Market news keywords
+NEWS_KW = frozenset({'news', 'market', 'trends', 'sector', 'update', 'latest', 'breaking'})
+
+# Currency keywords
+CURRENCY_KW = frozenset({'currency', 'forex', 'convert', 'exchange rate', 'eur', 'gbp', 'jpy',
+                         'usd', 'international', 'pkr', 'rupees', 'pakistan', 'inr', 'cny',
+                         'cad', 'aud', 'chf', 'aed', 'sar', 'subtract', 'add', 'multiply'})
+
+def _keyword_pattern(keywords) -> "re.Pattern[str]":
+    """Compile a keyword set (and plurals) into one case-insensitive whole-word regex."""
+    forms = set(keywords)
+    forms.update(keyword + "s" for keyword in keywords if keyword[-1].isalnum())
+
+    alternatives = []
+    # Longest first so a phrase or plural wins over its prefix
+    for form in sorted(forms, key=len, reverse=True):
+        alternative = re.escape(form)
+        if form[0].isalnum():
+            alternative = r"(?<!\w)" + alternative
+        if form[-1].isalnum():
+            alternative += r"(?!\w)"
+        alternatives.append(alternative)
+
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+# Compiled pattern and agent for each domain route, in priority order
+ROUTES: List[Tuple["re.Pattern[str]", Agent]] = [
+    (_keyword_pattern(STOCK_KW), stock_agent),
+    (_keyword_pattern(PORTFOLIO_KW), portfolio_agent),
+    (_keyword_pattern(NEWS_KW), market_agent),
+    (_keyword_pattern(CURRENCY_KW), currency_agent),
+]
+
+# Math operations are not a domain of their own: they only pick the currency
+# agent (for calculations with money) when no domain route matches
+MATH_PATTERN = _keyword_pattern(MATH_KW)
+
+
+def route_query(query: str) -> List[Agent]:
+    """Pick the specialist agents for a query based on its keywords, most specific first."""
+    # Manual routing based on query keywords (since handoffs don't work well with OpenRouter)
+    # Route to every matching domain agent, in priority order
+    matched = []
+    for pattern, agent in ROUTES:
+        if agent not in matched and pattern.search(query):
+            matched.append(agent)
+
+    if not matched and MATH_PATTERN.search(query):
+        matched.append(currency_agent)
+
+    # Default to triage
+    return matched or [triage_agent]
+
+
+def format_agent_error(e: Exception) -> str:
+    """Turn an agent failure into a user-friendly message."""
+    error_msg = str(e)
+    # Handle specific errors with helpful messages
+    if "401" in error_msg or "User not found" in error_msg:
+        return "⚠️ API Error: Unable to connect to the service. This might be due to rate limiting on the free tier. Please wait a moment and try again."
+    elif "429" in error_msg or "rate limit" in error_msg.lower():
+        return "⚠️ Rate Limit: Too many requests. Please wait a moment and try again."
+    elif "402" in error_msg:
+        return "⚠️ Token Limit: Request too large. Please try a shorter query."
+    else:
+        return f"⚠️ Error: {error_msg}"
+
+
+class LoopSemaphore:
+    """
+    Semaphore created lazily for the running event loop.
+    Before Python 3.10 asyncio primitives bind to the loop current at creation,
+    so a module-level Semaphore breaks under asyncio.run() or in another thread.
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._loop = None
+        self._sem = None
+
+    def _get(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._sem = loop, asyncio.Semaphore(self._value)
+        return self._sem
+
+    async def __aenter__(self):
+        return await self._get().__aenter__()
+
+    async def __aexit__(self, *exc_info):
+        return await self._get().__aexit__(*exc_info)
+
+
+# Maximum number of agent runs in flight at once - tune to the provider's rate limit
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+_LLM_SEM = LoopSemaphore(LLM_MAX_CONCURRENCY)
+
+# Attempts per agent run when rate limited, backing off 1s, 2s, 4s... (capped at 16s)
+LLM_MAX_ATTEMPTS = 4
+
+
+async def _session_size(session: Optional[SQLiteSession]) -> int:
+    """Number of items stored in the session (0 without one)."""
+    return len(await session.get_items()) if session else 0
+
+
+async def _prepare_retry(attempt: int, session: Optional[SQLiteSession] = None, size: int = 0) -> None:
+    """
+    Get ready to retry a rate-limited run. The SDK saves the user input to the
+    session before calling the model, so the session is first rolled back to
+    the size it had before the failed attempt. Then wait 1s, 2s, 4s... (capped
+    at 16s), outside the semaphore so other runs can proceed meanwhile.
+    """
+    if session:
+        for _ in range(await _session_size(session) - size):
+            await session.pop_item()
+    await asyncio.sleep(min(2 ** (attempt - 1), 16))
+
+
+async def run_agent(agent: Agent, input, **kwargs):
+    """Run an agent under the shared concurrency limit, retrying with backoff when rate limited."""
+    session = kwargs.get("session")
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        size = await _session_size(session)
+        try:
+            async with _LLM_SEM:
+                return await Runner.run(agent, input, **kwargs)
+        except RateLimitError:
+            if attempt == LLM_MAX_ATTEMPTS:
+                raise
+        await _prepare_retry(attempt, session, size)
+
+
+async def run_agents_parallel(agents: List[Agent], query: str, session: SQLiteSession = None) -> str:
+    """
+    Run several specialist agents on the same query concurrently and combine their answers.
+    With SYNTHESIS_MIN_AGENTS or more answers, a synthesizer agent merges them into one reply.
+    """
+    # Agents share the conversation history as read-only input; the combined
+    # exchange is written back once so concurrent runs don't interleave in the session
+    history = await session.get_items() if session else []
+    input_items = history + [{"role": "user", "content": query}]
+
+    results = await asyncio.gather(
+        *(run_agent(agent, input_items) for agent in agents),
+        return_exceptions=True
+    )
+
+    sections = []
+    for agent, result in zip(agents, results):
+        answer = format_agent_error(result) if isinstance(result, Exception) else result.final_output
+        sections.append(f"### {agent.name}\n\n{answer}")
+    response = "\n\n".join(sections)
+
+    if len(agents) >= SYNTHESIS_MIN_AGENTS:
+        try:
+            synthesis = await run_agent(
+                synthesizer_agent,
+                f"Question: {query}\n\nSpecialist answers:\n\n{response}"
+            )
+            response = synthesis.final_output
+        except Exception:
+            # Keep the specialists' answers rather than losing them to a failed merge
+            pass
+
+    if session:
+        await session.add_items([
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": response},
+        ])
+
+    return response
+
+
+NO_API_KEY_MESSAGE = "⚠️  Error: No API key configured. Please add OPENAI_API_KEY to .env file."
+
+
+async def run_finance_agent(query: str, session: SQLiteSession = None, stream: bool = False):
+    """
+    Main function to run the finance agent with a user query.
+    With stream=True, returns an async iterator of response text chunks instead of the full answer.
+    """
+    if stream:
+        return run_finance_agent_stream(query, session=session)
+
     try:
         # Check for API key
-        api_key, provider = get_api_key()
-        if not api_key:
-            return "⚠️  Error: No API key configured. Please add OPENAI_API_KEY to .env file."
-
-        # Configure client based on provider
-        if provider == "openrouter":
-            # Configure for OpenRouter (Google Gemini via OpenRouter)
-            configure_openai_client()
-        elif provider == "google":
-            # Google key via OpenRouter
-            configure_openai_client()
-        elif provider == "openai":
-            # Direct OpenAI API
-            os.environ["OPENAI_API_KEY"] = api_key
-
-        # Manual routing based on query keywords (since handoffs don't work well with OpenRouter)
-        query_lower = query.lower()
-
-        # Stock-related keywords
-        stock_keywords = ['stock', 'price', 'aapl', 'googl', 'tsla', 'nvda', 'msft', 'amzn',
-                         'meta', 'ticker', 'shares', 'equity', 'analysis']
-
-        # Portfolio-related keywords
-        portfolio_keywords = ['portfolio', 'investment', 'returns', 'risk', 'diversification',
-                             'holdings', 'asset', 'allocation']
-
-        # Market news keywords
-        news_keywords = ['news', 'market', 'trends', 'sector', 'update', 'latest', 'breaking']
-
-        # Currency keywords
-        currency_keywords = ['currency', 'forex', 'convert', 'exchange rate', 'eur', 'gbp', 'jpy',
-                           'usd', 'international', 'pkr', 'rupees', 'pakistan', 'inr', 'cny',
-                           'cad', 'aud', 'chf', 'aed', 'sar', 'subtract', 'add', 'multiply']
-
-        # Math/calculation keywords
-        math_keywords = ['subtract', 'add', 'multiply', 'divide', 'percent', '%', 'calculate']
-
-        # Route to appropriate agent
-        if any(keyword in query_lower for keyword in math_keywords):
-            # Math operations - use currency agent for calculations with money
-            target_agent = currency_agent
-        elif any(keyword in query_lower for keyword in stock_keywords):
-            target_agent = stock_agent
-        elif any(keyword in query_lower for keyword in portfolio_keywords):
-            target_agent = portfolio_agent
-        elif any(keyword in query_lower for keyword in news_keywords):
-            target_agent = market_agent
-        elif any(keyword in query_lower for keyword in currency_keywords):
-            target_agent = currency_agent
-        else:
-            # Default to triage
-            target_agent = triage_agent
+        if not setup_provider():
+            return NO_API_KEY_MESSAGE
+
+        agents = route_query(query)
+        if len(agents) > 1:
+            return await run_agents_parallel(agents, query, session=session)
+        target_agent = agents[0]
 
         # Run with session if provided (for conversation memory)
         if session:
-            result = await Runner.run(target_agent, query, session=session)
+            result = await run_agent(target_agent, query, session=session)
         else:
-            result = await Runner.run(target_agent, query)
+            result = await run_agent(target_agent, query)
 
         return result.final_output
 
     except Exception as e:
-        error_msg = str(e)
-        # Handle specific errors with helpful messages
-        if "401" in error_msg or "User not found" in error_msg:
-            return "⚠️ API Error: Unable to connect to the service. This might be due to rate limiting on the free tier. Please wait a moment and try again."
-        elif "429" in error_msg or "rate limit" in error_msg.lower():
-            return "⚠️ Rate Limit: Too many requests. Please wait a moment and try again."
-        elif "402" in error_msg:
-            return "⚠️ Token Limit: Request too large. Please try a shorter query."
-        else:
-            return f"⚠️ Error: {error_msg}"
+        return format_agent_error(e)
+
+
+async def run_finance_agent_stream(query: str, session: SQLiteSession = None) -> AsyncIterator[str]:
+    """Run the finance agent with a user query, yielding response text as it is generated."""
+    try:
+        # Check for API key
+        if not setup_provider():
+            yield NO_API_KEY_MESSAGE
+            return
+
+        agents = route_query(query)
+        if len(agents) > 1:
+            # Parallel answers are combined before display, so they arrive in one piece
+            yield await run_agents_parallel(agents, query, session=session)
+            return
+        target_agent = agents[0]
+
+        # Rate limits are retried like in run_agent, but only until the first
+        # text has been shown - after that a retry would repeat it
+        for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+            started = False
+            size = await _session_size(session)
+            try:
+                # Hold a concurrency slot for as long as the response is streaming
+                async with _LLM_SEM:
+                    # Run with session if provided (for conversation memory)
+                    if session:
+                        result = Runner.run_streamed(target_agent, query, session=session)
+                    else:
+                        result = Runner.run_streamed(target_agent, query)
+
+                    async for event in result.stream_events():
+                        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                            started = True
+                            yield event.data.delta
+                return
+            except RateLimitError:
+                if started or attempt == LLM_MAX_ATTEMPTS:
+                    raise
+            await _prepare_retry(attempt, session, size)
+
+    except Exception as e:
+        yield format_agent_error(e)
 
 
 # ==================== CLI INTERFACE ====================
 
+async def read_line(prompt: str) -> str:
+    """
+    Read a line from stdin without blocking the event loop.
+
+    input() runs on a daemon thread rather than asyncio.to_thread so that a
+    pending read never keeps the interpreter alive after Ctrl+C.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def reader():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, line)
+
+    threading.Thread(target=reader, daemon=True).start()
+    return await future
+
+
+async def prefetch_market_news(category: str = "stocks", limit: int = 5):
+    """Warm the market news cache while the user is still typing."""
+    await asyncio.to_thread(_fetch_market_news, category, limit)
+
+
+BANNER = "\n".join([
+    "🤖 Finance Agent - Powered by OpenAI Agents SDK",
+    "=" * 50,
+    "I can help you with:",
+    "📊 Stock analysis and prices",
+    "💼 Portfolio management and performance",
+    "📈 Market news and trends",
+    "💱 Currency conversion",
+    "⚠️ Risk assessment",
+    "\n✨ Conversation memory enabled - I remember our discussion!",
+    "Type 'quit' to exit or ask your financial question!",
+    "=" * 50,
+]) + "\n"
+
+# Streamed answers are flushed to the terminal in batches of roughly this many characters
+STREAM_FLUSH_CHARS = 80
+
+
+async def write_stream(chunks: AsyncIterator[str], header: str = "", flush_chars: int = STREAM_FLUSH_CHARS):
+    """
+    Echo streamed text, flushing stdout on newlines or once enough has been buffered.
+    The header is written together with the first chunk, after anything printed
+    while the stream was starting up.
+    """
+    pending: List[str] = [header]
+    size = 0
+    async for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= flush_chars or "\n" in chunk:
+            sys.stdout.write("".join(pending))
+            sys.stdout.flush()
+            pending.clear()
+            size = 0
+    pending.append("\n")
+    sys.stdout.write("".join(pending))
+    sys.stdout.flush()
+
+
+WARMUP_TIMEOUT = 5.0
+
+
+async def _warmup(timeout: float = WARMUP_TIMEOUT):
+    """Open a pooled connection to the provider before the first question is asked."""
+    if not OPENROUTER_API_KEY:
+        return
+    try:
+        await asyncio.wait_for(get_openai_client().models.list(), timeout)
+    except Exception:
+        # Best effort only - the first real request simply pays the handshake instead
+        pass
+
+
 async def main():
     """Interactive CLI for the Finance Agent."""
     # Disable tracing to avoid API key validation errors with OpenRouter
-    import sys
     if 'OPENAI_AGENTS_DISABLE_TRACING' not in os.environ:
         os.environ['OPENAI_AGENTS_DISABLE_TRACING'] = '1'
 
@@ -503,41 +932,59 @@ async def main():
     # Each conversation session is stored in SQLite database
     session = SQLiteSession("finance_conversation")
 
-    print("🤖 Finance Agent - Powered by OpenAI Agents SDK")
-    print("=" * 50)
-    print("I can help you with:")
-    print("📊 Stock analysis and prices")
-    print("💼 Portfolio management and performance")
-    print("📈 Market news and trends")
-    print("💱 Currency conversion")
-    print("⚠️ Risk assessment")
-    print("\n✨ Conversation memory enabled - I remember our discussion!")
-    print("Type 'quit' to exit or ask your financial question!")
-    print("=" * 50)
-
-    while True:
-        try:
-            user_input = input("\n💬 Your question: ").strip()
+    # Warm up the HTTPS connection while the user reads the banner
+    warmup = asyncio.create_task(_warmup())
+
+    sys.stdout.write(BANNER)
+    sys.stdout.flush()
 
-            if user_input.lower() in ['quit', 'exit', 'bye']:
-                print("Goodbye! 👋")
+    try:
+        while True:
+            try:
+                # Speculatively warm the news cache; it is dropped as soon as input arrives
+                prefetch = asyncio.create_task(prefetch_market_news())
+                try:
+                    user_input = (await read_line("\n💬 Your question: ")).strip()
+                finally:
+                    prefetch.cancel()
+
+                if user_input.lower() in ['quit', 'exit', 'bye']:
+                    print("Goodbye! 👋")
+                    break
+
+                if not user_input:
+                    continue
+
+                sys.stdout.write("\n🤔 Processing your request...\n")
+                sys.stdout.flush()
+                # Pass session to maintain conversation context, printing the answer as it streams in
+                chunks = await run_finance_agent(user_input, session=session, stream=True)
+                await write_stream(chunks, header="\n📝 Answer:\n")
+
+            except (KeyboardInterrupt, EOFError, asyncio.CancelledError):
+                print("\n\nGoodbye! 👋")
                 break
+            except Exception as e:
+                print(f"\n❌ Error: {str(e)}")
 
-            if not user_input:
-                continue
+    finally:
+        warmup.cancel()
+        # Release the shared client's pooled connections
+        if get_openai_client.cache_info().currsize:
+            await get_openai_client().close()
 
-            print("\n🤔 Processing your request...")
-            # Pass session to maintain conversation context
-            response = await run_finance_agent(user_input, session=session)
-            print(f"\n📝 Answer:\n{response}")
 
-        except KeyboardInterrupt:
-            print("\n\nGoodbye! 👋")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {str(e)}")
+def install_fast_event_loop():
+    """Use uvloop's libuv-based event loop when it is installed (not available on Windows)."""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
 
 
 if __name__ == "__main__":
     # Example usage
+    install_fast_event_loop()
     asyncio.run(main())
\ No newline at end of file
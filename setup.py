@@ -3,15 +3,18 @@
 Setup script for Finance Agent - helps users get started quickly
 """
 
+import hashlib
+import json
 import os
 import sys
 import subprocess
 import platform
+from collections import deque
+from pathlib import Path
 
 
-def print_banner():
-    """Print a welcome banner."""
-    print("""
+# Static setup text, each written to stdout in a single call
+_BANNER = """
     🤖 Finance Agent Setup
     ======================
     Powered by OpenAI Agents SDK
@@ -24,34 +27,132 @@ def print_banner():
     ⚠️  Risk Assessment
 
     Let's get you started! 🚀
-    """)
+    """ + "\n"
+
+_NEXT_STEPS = """
+🎉 Setup Complete!
+========================================
+
+Next steps:
+1. 🧪 Test the installation:
+   python finance_agent.py
+   (or: python quick_test.py for a quick test)
+
+2. 📊 Try some examples:
+   - 'What's the current price of AAPL?'
+   - 'Analyze my portfolio with 100 AAPL at $150'
+   - 'What's the latest market news?'
+
+3. 📖 Explore the examples:
+   python example_usage.py
+
+4. 🔧 Advanced usage:
+   - Check out README.md for full documentation
+   - Run test suite: python test_finance_agent.py
+   - Customize finance_agent.py for your needs
+
+5. 🚀 Need more features?
+   - Add real financial APIs in finance_agent.py
+   - Extend with new tools and agents
+   - Integrate with your existing systems
+
+📁 Project structure:
+   finance_agent.py    - Main agent implementation
+   example_usage.py    - Usage examples
+   test_finance_agent.py - Test suite
+   quick_test.py       - Quick verification
+   requirements.txt    - Dependencies
+   README.md          - Full documentation
+"""
+
+_SETUP_HEADER = "\n" + "=" * 50 + "\nSETUP PROCESS\n" + "=" * 50 + "\n"
+
+_SETUP_FOOTER = "\n" + "=" * 50 + "\n✅ Setup completed successfully!\nHappy financial analyzing! 📊💰\n" + "=" * 50 + "\n"
+
+
+def _confirm(prompt, default=True):
+    """Ask a yes/no question; without a terminal (CI, Docker builds) return the default."""
+    if not sys.stdin.isatty():
+        return default
+    return input(prompt).strip().lower() in ('y', 'yes')
+
+
+def print_banner():
+    """Print a welcome banner."""
+    sys.stdout.write(_BANNER)
 
 
 def check_python_version():
     """Check if Python version is compatible."""
     version = sys.version_info
-    if version.major < 3 or (version.major == 3 and version.minor < 8):
+    if version < (3, 8):
         print(f"❌ Error: Python 3.8+ required. You have {version.major}.{version.minor}.{version.micro}")
         return False
     print(f"✅ Python {version.major}.{version.minor}.{version.micro} detected")
     return True
 
 
+# Number of trailing pip output lines repeated when an install fails
+PIP_TAIL_LINES = 20
+
+# Records the requirements.txt hash and interpreter of the last successful install
+SETUP_CACHE = Path(".setup_cache")
+
+
+def _requirements_state():
+    """Fingerprint of requirements.txt and the running interpreter."""
+    digest = hashlib.sha256(Path("requirements.txt").read_bytes()).hexdigest()
+    return {"requirements_sha": digest, "python": sys.version, "executable": sys.executable}
+
+
+def _load_setup_cache():
+    """Return the cached install state, or an empty dict if there is none."""
+    try:
+        cache = json.loads(SETUP_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
 def install_dependencies():
     """Install required dependencies."""
     print("\n📦 Installing dependencies...")
 
     try:
-        # Try to use pip from the same Python interpreter
-        pip_cmd = [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"]
-
-        result = subprocess.run(pip_cmd, capture_output=True, text=True)
+        # Skip pip entirely if nothing changed since the last successful install
+        state = _requirements_state()
+        cache = _load_setup_cache()
+        if all(cache.get(key) == value for key, value in state.items()):
+            print("✅ Requirements already satisfied (cached)")
+            return True
 
-        if result.returncode == 0:
+        # Try to use pip from the same Python interpreter, installing everything in one
+        # batch without the version-check request or accidental source builds
+        pip_cmd = [
+            sys.executable, "-m", "pip", "install",
+            "--disable-pip-version-check", "--no-input", "--prefer-binary",
+            "-r", "requirements.txt",
+        ]
+
+        # Forward pip's output line by line, keeping only a short tail for the error report
+        tail = deque(maxlen=PIP_TAIL_LINES)
+        with subprocess.Popen(pip_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, bufsize=1) as proc:
+            for line in proc.stdout:
+                sys.stdout.write(line)
+                tail.append(line)
+            returncode = proc.wait()
+
+        if returncode == 0:
             print("✅ Dependencies installed successfully!")
+            try:
+                SETUP_CACHE.write_text(json.dumps(state), encoding="utf-8")
+            except OSError:
+                pass
             return True
         else:
-            print(f"❌ Installation failed: {result.stderr}")
+            print(f"❌ Installation failed (pip exited with code {returncode}). Last lines of output:")
+            sys.stdout.write("".join(tail))
             return False
 
     except Exception as e:
@@ -70,9 +171,8 @@ def setup_openai_key():
     print("2. API key from https://platform.openai.com/api-keys")
     print("3. Add funds to your account")
 
-    choice = input("\nWould you like to set up your OpenAI API key now? (y/n): ").strip().lower()
-
-    if choice in ['y', 'yes']:
+    # Non-interactive runs skip this, since entering the key needs a terminal
+    if _confirm("\nWould you like to set up your OpenAI API key now? (y/n): ", default=False):
         api_key = input("Enter your OpenAI API key (sk-...): ").strip()
 
         if api_key.startswith("sk-") and len(api_key) > 20:
@@ -80,11 +180,9 @@ def setup_openai_key():
             os.environ["OPENAI_API_KEY"] = api_key
 
             # Offer to save to .env file
-            save_choice = input("Save to .env file for future use? (y/n): ").strip().lower()
-
-            if save_choice in ['y', 'yes']:
+            if _confirm("Save to .env file for future use? (y/n): "):
                 try:
-                    with open(".env", "a") as f:
+                    with Path(".env").open("a", encoding="utf-8") as f:
                         f.write(f"\nOPENAI_API_KEY={api_key}\n")
                     print("✅ API key saved to .env file")
                 except Exception as e:
@@ -102,9 +200,8 @@ def setup_openai_key():
         return True
 
 
-def create_test_script():
-    """Create a simple test script for quick verification."""
-    test_content = '''#!/usr/bin/env python3
+# Simple test script for quick verification
+QUICK_TEST_SCRIPT = '''#!/usr/bin/env python3
 """
 Quick test script to verify the Finance Agent is working
 """
@@ -132,17 +229,8 @@ if __name__ == "__main__":
     asyncio.run(quick_test())
 '''
 
-    try:
-        with open("quick_test.py", "w") as f:
-            f.write(test_content)
-        print("✅ Created quick_test.py")
-    except Exception as e:
-        print(f"⚠️  Could not create quick_test.py: {e}")
-
-
-def create_bash_script():
-    """Create a bash script for easy execution on Linux/Mac."""
-    bash_content = '''#!/bin/bash
+# Bash launcher for Linux/Mac
+BASH_LAUNCHER = '''#!/bin/bash
 # Finance Agent Launcher
 
 echo "🤖 Finance Agent - Starting..."
@@ -158,21 +246,8 @@ fi
 python3 finance_agent.py
 '''
 
-    try:
-        with open("run_finance_agent.sh", "w") as f:
-            f.write(bash_content)
-
-        # Make executable
-        os.chmod("run_finance_agent.sh", 0o755)
-        print("✅ Created run_finance_agent.sh (executable)")
-
-    except Exception as e:
-        print(f"⚠️  Could not create bash script: {e}")
-
-
-def create_windows_batch():
-    """Create a Windows batch file."""
-    batch_content = '''@echo off
+# Windows batch launcher
+WINDOWS_LAUNCHER = '''@echo off
 REM Finance Agent Launcher for Windows
 
 echo ==============================
@@ -194,49 +269,30 @@ python finance_agent.py
 pause
 '''
 
-    try:
-        with open("run_finance_agent.bat", "w") as f:
-            f.write(batch_content)
-        print("✅ Created run_finance_agent.bat")
-    except Exception as e:
-        print(f"⚠️  Could not create batch file: {e}")
-
-
-def display_next_steps():
-    """Display what to do next."""
-    print("\n🎉 Setup Complete!")
-    print("=" * 40)
+# Helper scripts written by setup, as {filename: (content, executable)}
+HELPER_SCRIPTS = {
+    "quick_test.py": (QUICK_TEST_SCRIPT, False),
+    "run_finance_agent.sh": (BASH_LAUNCHER, True),
+    "run_finance_agent.bat": (WINDOWS_LAUNCHER, False),
+}
 
-    print("\nNext steps:")
-    print("1. 🧪 Test the installation:")
-    print("   python finance_agent.py")
-    print("   (or: python quick_test.py for a quick test)")
 
-    print("\n2. 📊 Try some examples:")
-    print("   - 'What's the current price of AAPL?'")
-    print("   - 'Analyze my portfolio with 100 AAPL at $150'")
-    print("   - 'What's the latest market news?'")
+def create_helper_scripts():
+    """Write the quick test script and the platform launchers."""
+    for name, (content, executable) in HELPER_SCRIPTS.items():
+        try:
+            path = Path(name)
+            path.write_text(content, encoding="utf-8")
+            if executable:
+                path.chmod(0o755)
+            print(f"✅ Created {name}{' (executable)' if executable else ''}")
+        except Exception as e:
+            print(f"⚠️  Could not create {name}: {e}")
 
-    print("\n3. 📖 Explore the examples:")
-    print("   python example_usage.py")
 
-    print("\n4. 🔧 Advanced usage:")
-    print("   - Check out README.md for full documentation")
-    print("   - Run test suite: python test_finance_agent.py")
-    print("   - Customize finance_agent.py for your needs")
-
-    print("\n5. 🚀 Need more features?")
-    print("   - Add real financial APIs in finance_agent.py")
-    print("   - Extend with new tools and agents")
-    print("   - Integrate with your existing systems")
-
-    print("\n📁 Project structure:")
-    print("   finance_agent.py    - Main agent implementation")
-    print("   example_usage.py    - Usage examples")
-    print("   test_finance_agent.py - Test suite")
-    print("   quick_test.py       - Quick verification")
-    print("   requirements.txt    - Dependencies")
-    print("   README.md          - Full documentation")
+def display_next_steps():
+    """Display what to do next."""
+    sys.stdout.write(_NEXT_STEPS)
 
 
 def main():
@@ -246,24 +302,19 @@ def main():
     if not check_python_version():
         return
 
-    # Check if files already exist
-    existing_files = []
+    # Check if files already exist (one directory listing instead of a stat per file)
     required_files = ["finance_agent.py", "requirements.txt", "README.md"]
-
-    for file in required_files:
-        if os.path.exists(file):
-            existing_files.append(file)
+    with os.scandir(".") as entries:
+        present = {entry.name for entry in entries}
+    existing_files = [file for file in required_files if file in present]
 
     if existing_files:
         print(f"\n⚠️  Found existing files: {', '.join(existing_files)}")
-        overwrite = input("Continue setup? (y/n): ").strip().lower()
-        if overwrite not in ['y', 'yes']:
+        if not _confirm("Continue setup? (y/n): "):
             print("Setup cancelled.")
             return
 
-    print("\n" + "=" * 50)
-    print("SETUP PROCESS")
-    print("=" * 50)
+    sys.stdout.write(_SETUP_HEADER)
 
     # Install dependencies
     deps_success = install_dependencies()
@@ -278,17 +329,12 @@ def main():
 
     # Create helper scripts
     print("\n🔧 Creating helper scripts...")
-    create_test_script()
-    create_bash_script()
-    create_windows_batch()
+    create_helper_scripts()
 
     # Display next steps
     display_next_steps()
 
-    print("\n" + "=" * 50)
-    print("✅ Setup completed successfully!")
-    print("Happy financial analyzing! 📊💰")
-    print("=" * 50)
+    sys.stdout.write(_SETUP_FOOTER)
 
 
 if __name__ == "__main__":
@@ -3,100 +3,202 @@
 Simple test script to verify the Finance Agent functionality
 """
 
+import argparse
 import asyncio
+import functools
+import io
+import os
+import statistics
 import sys
-from finance_agent import run_finance_agent
+import time
+from finance_agent import run_finance_agent, get_openai_client, LoopSemaphore
 
+# Maximum number of agent queries in flight at once across all test groups
+MAX_CONCURRENCY = int(os.getenv("FINANCE_AGENT_CONCURRENCY", "8"))
+_QUERY_SEM = LoopSemaphore(MAX_CONCURRENCY)
 
-async def test_basic_functionality():
-    """Test basic agent functionality with simple queries."""
-    print("🧪 Testing Finance Agent Basic Functionality")
-    print("=" * 50)
-
-    test_cases = [
-        {
-            "name": "Stock Price Query",
-            "query": "What's the current price of AAPL?",
-            "expected_in_response": ["AAPL", "price", "dollar"]
-        },
-        {
-            "name": "Portfolio Analysis",
-            "query": "Analyze my portfolio with 50 shares of MSFT at $300",
-            "expected_in_response": ["portfolio", "value", "analysis"]
-        },
-        {
-            "name": "Market News",
-            "query": "What's the latest market news?",
-            "expected_in_response": ["news", "market", "headline"]
-        },
-        {
-            "name": "Currency Conversion",
-            "query": "Convert 100 USD to EUR",
-            "expected_in_response": ["USD", "EUR", "conversion"]
-        }
-    ]
 
-    success_count = 0
-    total_tests = len(test_cases)
+async def guarded(query):
+    """Run a query through the finance agent, limited to MAX_CONCURRENCY at once."""
+    async with _QUERY_SEM:
+        return await run_finance_agent(query)
 
-    for test in test_cases:
-        print(f"\n📋 Test: {test['name']}")
-        print(f"❓ Query: {test['query']}")
 
-        try:
-            response = await run_finance_agent(test['query'])
-
-            if response:
-                response_lower = str(response).lower()
-
-                # Check if expected keywords are in response
-                found_keywords = []
-                for keyword in test['expected_in_response']:
-                    if keyword.lower() in response_lower:
-                        found_keywords.append(keyword)
-
-                if found_keywords:
-                    print(f"✅ PASS - Found keywords: {found_keywords}")
-                    print(f"📝 Response: {str(response)[:100]}...")
-                    success_count += 1
-                else:
-                    print(f"❌ FAIL - Missing expected keywords")
-                    print(f"📝 Response: {str(response)[:100]}...")
-            else:
-                print(f"❌ FAIL - No response received")
+# Set FINANCE_AGENT_TEST_CACHE to answer repeated queries from one shared run
+USE_RESPONSE_CACHE = bool(os.getenv("FINANCE_AGENT_TEST_CACHE"))
+_CACHE: dict = {}
 
+
+async def _memo(query):
+    """Run a query once per suite run when caching is enabled; concurrent repeats share the task."""
+    if not USE_RESPONSE_CACHE:
+        return await guarded(query)
+
+    task = _CACHE.get(query)
+    if task is None:
+        task = asyncio.create_task(guarded(query))
+        _CACHE[query] = task
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        # Don't keep failures around; the next request for this query retries it
+        if _CACHE.get(query) is task:
+            del _CACHE[query]
+        raise
+
+
+async def run_concurrently(coros):
+    """
+    Run coroutines concurrently and return their results in order, with any
+    exception returned in place of its result so one failure never cancels the rest.
+    Uses a TaskGroup on Python 3.11+ and asyncio.gather otherwise.
+    """
+    if sys.version_info < (3, 11):
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    async def capture(coro):
+        try:
+            return await coro
         except Exception as e:
-            print(f"❌ ERROR - {type(e).__name__}: {str(e)}")
+            return e
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(capture(coro)) for coro in coros]
+    return [task.result() for task in tasks]
 
-    print(f"\n🎯 Results: {success_count}/{total_tests} tests passed")
+
+def buffered_output(test):
+    """Collect a test's report in memory and write it to stdout in one go."""
+    @functools.wraps(test)
+    async def wrapper(out=None):
+        if out is not None:
+            return await test(out=out)
+        buf = io.StringIO()
+        try:
+            return await test(out=buf)
+        finally:
+            sys.stdout.write(buf.getvalue())
+            sys.stdout.flush()
+    return wrapper
+
+
+def _short(r, n=100):
+    """Preview of a response, truncated to n characters."""
+    # Prefer an agent result's final text over the repr of the whole result
+    text = getattr(r, "final_output", None)
+    if not isinstance(text, str):
+        text = str(r)
+    return text[:n] + ("..." if len(text) > n else "")
+
+
+# Timed runs per benchmark query; the median is reported
+BENCH_RUNS = 5
+
+# Very long query for the edge case tests, built once at import
+_LONG_QUERY = "A" * 1000
+
+# Basic test cases; expected keywords are matched case-insensitively
+BASIC_TEST_CASES = [
+    {
+        "name": "Stock Price Query",
+        "query": "What's the current price of AAPL?",
+        "expected_in_response": ["AAPL", "price", "dollar"]
+    },
+    {
+        "name": "Portfolio Analysis",
+        "query": "Analyze my portfolio with 50 shares of MSFT at $300",
+        "expected_in_response": ["portfolio", "value", "analysis"]
+    },
+    {
+        "name": "Market News",
+        "query": "What's the latest market news?",
+        "expected_in_response": ["news", "market", "headline"]
+    },
+    {
+        "name": "Currency Conversion",
+        "query": "Convert 100 USD to EUR",
+        "expected_in_response": ["USD", "EUR", "conversion"]
+    }
+]
+
+# Lowercase the expected keywords once rather than on every check
+for _test in BASIC_TEST_CASES:
+    _test["expected_lower"] = [keyword.lower() for keyword in _test["expected_in_response"]]
+
+
+@buffered_output
+async def test_basic_functionality(out=None):
+    """Test basic agent functionality with simple queries."""
+    print("🧪 Testing Finance Agent Basic Functionality", file=out)
+    print("=" * 50, file=out)
+
+    success_count = 0
+    total_tests = len(BASIC_TEST_CASES)
+
+    # The queries are independent, so send them all at once
+    responses = await run_concurrently([_memo(test['query']) for test in BASIC_TEST_CASES])
+
+    for test, response in zip(BASIC_TEST_CASES, responses):
+        print(f"\n📋 Test: {test['name']}", file=out)
+        print(f"❓ Query: {test['query']}", file=out)
+
+        if isinstance(response, Exception):
+            print(f"❌ ERROR - {type(response).__name__}: {str(response)}", file=out)
+        elif response:
+            # Convert the response once and derive everything else from that string
+            text = str(response)
+            response_lower = text.lower()
+            preview = _short(text, 100)
+
+            # Check if expected keywords are in response
+            found_keywords = [
+                keyword
+                for keyword, keyword_lower in zip(test['expected_in_response'], test['expected_lower'])
+                if keyword_lower in response_lower
+            ]
+
+            if found_keywords:
+                print(f"✅ PASS - Found keywords: {found_keywords}", file=out)
+                print(f"📝 Response: {preview}", file=out)
+                success_count += 1
+            else:
+                print(f"❌ FAIL - Missing expected keywords", file=out)
+                print(f"📝 Response: {preview}", file=out)
+        else:
+            print(f"❌ FAIL - No response received", file=out)
+
+    print(f"\n🎯 Results: {success_count}/{total_tests} tests passed", file=out)
     return success_count == total_tests
 
 
-async def test_error_handling():
+@buffered_output
+async def test_error_handling(out=None):
     """Test how the agent handles edge cases."""
-    print("\n🧪 Testing Error Handling")
-    print("=" * 30)
+    print("\n🧪 Testing Error Handling", file=out)
+    print("=" * 30, file=out)
 
     edge_cases = [
         "This is a completely unrelated query about cooking recipes",
         "",
-        "A" * 1000,  # Very long query
+        _LONG_QUERY,
         "What is the meaning of life, the universe, and everything?",
     ]
 
-    for i, query in enumerate(edge_cases, 1):
-        print(f"\n📋 Edge Case {i}: {query[:50]}{'...' if len(query) > 50 else ''}")
-        try:
-            response = await run_finance_agent(query)
-            print(f"✅ Handled gracefully: {str(response)[:100]}...")
-        except Exception as e:
-            print(f"❌ Exception: {type(e).__name__}: {str(e)}")
+    responses = await run_concurrently([_memo(query) for query in edge_cases])
+
+    for i, (query, response) in enumerate(zip(edge_cases, responses), 1):
+        print(f"\n📋 Edge Case {i}: {query[:50]}{'...' if len(query) > 50 else ''}", file=out)
+        if isinstance(response, Exception):
+            print(f"❌ Exception: {type(response).__name__}: {str(response)}", file=out)
+        else:
+            print(f"✅ Handled gracefully: {_short(response, 100)}", file=out)
 
 
-async def test_structured_queries():
+@buffered_output
+async def test_structured_queries(out=None):
     """Test more complex, structured queries."""
-    print("\n🧪 Testing Structured Queries")
-    print("=" * 35)
+    print("\n🧪 Testing Structured Queries", file=out)
+    print("=" * 35, file=out)
 
     complex_queries = [
         "Get current prices for Apple (AAPL) and Microsoft (MSFT)",
@@ -105,24 +207,28 @@ async def test_structured_queries():
         "Analyze my portfolio: 100 AAPL at $150, 50 MSFT at $300",
     ]
 
-    for i, query in enumerate(complex_queries, 1):
-        print(f"\n📋 Complex Query {i}: {query}")
-        try:
-            response = await run_finance_agent(query)
-            if response and len(str(response)) > 10:
-                print(f"✅ Success: {str(response)[:150]}...")
+    responses = await run_concurrently([_memo(query) for query in complex_queries])
+
+    for i, (query, response) in enumerate(zip(complex_queries, responses), 1):
+        print(f"\n📋 Complex Query {i}: {query}", file=out)
+        if isinstance(response, Exception):
+            print(f"❌ Error: {type(response).__name__}: {str(response)}", file=out)
+        else:
+            text = str(response)
+            if response and len(text) > 10:
+                print(f"✅ Success: {_short(text, 150)}", file=out)
             else:
-                print(f"⚠️  Minimal response: {str(response)}")
-        except Exception as e:
-            print(f"❌ Error: {type(e).__name__}: {str(e)}")
+                print(f"⚠️  Minimal response: {text}", file=out)
 
 
-async def benchmark_performance():
+@buffered_output
+async def benchmark_performance(out=None):
     """Simple performance test."""
-    print("\n⏱️  Performance Test")
-    print("=" * 20)
+    print("\n⏱️  Performance Test", file=out)
+    print("=" * 20, file=out)
 
-    import time
+    # Monotonic, high-resolution clock for the timings
+    now = time.perf_counter
 
     queries = [
         "Get stock price for AAPL",
@@ -130,26 +236,105 @@ async def benchmark_performance():
         "What's the latest market news?"
     ]
 
+    async def timed(query):
+        """Run one query and return its response with its own latency."""
+        # Call the agent directly: the test-suite semaphore would add queueing time
+        start_time = now()
+        response = await run_finance_agent(query)
+        return response, now() - start_time
+
+    async def sample(query):
+        """Time BENCH_RUNS back-to-back runs of one query."""
+        samples = []
+        for _ in range(BENCH_RUNS):
+            response, elapsed = await timed(query)
+            samples.append(elapsed)
+        return response, samples
+
+    # Warm up imports and the connection pool so the first sample isn't an outlier
+    try:
+        await run_finance_agent("ping")
+    except Exception:
+        pass
+
     total_time = 0
 
+    # Sample one query at a time so no sample waits on a concurrency slot
     for i, query in enumerate(queries, 1):
-        print(f"\nTest {i}: {query}")
-        start_time = time.time()
-
+        print(f"\nTest {i}: {query}", file=out)
         try:
-            response = await run_finance_agent(query)
-            end_time = time.time()
-            elapsed = end_time - start_time
-            total_time += elapsed
-
-            print(f"✅ Completed in {elapsed:.2f}s")
-            print(f"📝 Response length: {len(str(response))} chars")
+            response, samples = await sample(query)
         except Exception as e:
-            print(f"❌ Failed: {e}")
-
-    print(f"\n📊 Performance Summary:")
-    print(f"   Total time: {total_time:.2f}s")
-    print(f"   Average per query: {total_time/len(queries):.2f}s")
+            print(f"❌ Failed: {e}", file=out)
+            continue
+
+        median = statistics.median(samples)
+        total_time += median
+
+        print(f"✅ Median {median:.2f}s ± {statistics.pstdev(samples):.2f}s over {len(samples)} runs", file=out)
+        print(f"📝 Response length: {len(str(response))} chars", file=out)
+
+    print(f"\n📊 Performance Summary:", file=out)
+    print(f"   Total time (sum of medians): {total_time:.2f}s", file=out)
+    print(f"   Average per query: {total_time/len(queries):.2f}s", file=out)
+
+
+async def close_client():
+    """Release finance_agent's pooled client if any test created it."""
+    if get_openai_client.cache_info().currsize:
+        await get_openai_client().close()
+
+
+async def run_groups(groups):
+    """
+    Run test groups concurrently, then any exclusive groups one by one once the
+    others are done. Each group writes to its own buffer and the reports are
+    printed in order afterwards. Returns False if any group reported a failure.
+    """
+    buffers = {group: io.StringIO() for group in groups}
+    shared = [group for group in groups if group not in EXCLUSIVE_GROUPS]
+    results = await asyncio.gather(*(group(out=buffers[group]) for group in shared))
+    for group in groups:
+        if group in EXCLUSIVE_GROUPS:
+            results.append(await group(out=buffers[group]))
+    for group in groups:
+        sys.stdout.write(buffers[group].getvalue())
+    return all(result is not False for result in results)
+
+
+# Command-line flag and coroutine for each test group, in report order
+TEST_GROUPS = {
+    "basic": test_basic_functionality,
+    "errors": test_error_handling,
+    "structured": test_structured_queries,
+    "bench": benchmark_performance,
+}
+
+# Groups that must run alone: benchmark timings would otherwise include time
+# spent queued behind the other groups' queries
+EXCLUSIVE_GROUPS = {benchmark_performance}
+
+
+def parse_args(argv=None):
+    """Parse the test group selection; no flags means the interactive menu."""
+    parser = argparse.ArgumentParser(description="Finance Agent test suite")
+    parser.add_argument("--basic", action="store_true", help="run the basic functionality tests")
+    parser.add_argument("--errors", action="store_true", help="run the error handling tests")
+    parser.add_argument("--structured", action="store_true", help="run the structured query tests")
+    parser.add_argument("--bench", action="store_true", help="run the performance benchmark")
+    parser.add_argument("--all", action="store_true", help="run every test group")
+    return parser.parse_args(argv)
+
+
+async def _run_selected(args):
+    """Run the test groups chosen on the command line without prompting."""
+    try:
+        groups = [group for name, group in TEST_GROUPS.items() if args.all or getattr(args, name)]
+        all_passed = await run_groups(groups)
+        print(f"\n🎯 Overall Result: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+        return all_passed
+    finally:
+        await close_client()
 
 
 async def main():
@@ -157,50 +342,56 @@ async def main():
     print("🚀 Finance Agent Test Suite")
     print("=" * 40)
 
-    while True:
-        print("\nSelect test to run:")
-        print("1. Basic Functionality Test")
-        print("2. Error Handling Test")
-        print("3. Structured Queries Test")
-        print("4. Performance Benchmark")
-        print("5. Run All Tests")
-        print("6. Exit")
-
-        choice = input("\nEnter choice (1-6): ").strip()
-
-        if choice == "1":
-            await test_basic_functionality()
-        elif choice == "2":
-            await test_error_handling()
-        elif choice == "3":
-            await test_structured_queries()
-        elif choice == "4":
-            await benchmark_performance()
-        elif choice == "5":
-            print("\n" + "="*50)
-            print("RUNNING COMPLETE TEST SUITE")
-            print("="*50)
-
-            all_passed = await test_basic_functionality()
-            await test_error_handling()
-            await test_structured_queries()
-            await benchmark_performance()
-
-            print(f"\n🎯 Overall Result: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
-
-        elif choice == "6":
-            print("Goodbye! 👋")
-            break
-        else:
-            print("Invalid choice. Please select 1-6.")
+    # All queries share finance_agent's pooled client, so TCP/TLS connections are
+    # reused across tests; close it once when the suite exits
+    try:
+        while True:
+            print("\nSelect test to run:")
+            print("1. Basic Functionality Test")
+            print("2. Error Handling Test")
+            print("3. Structured Queries Test")
+            print("4. Performance Benchmark")
+            print("5. Run All Tests")
+            print("6. Exit")
+
+            choice = input("\nEnter choice (1-6): ").strip()
+
+            if choice == "1":
+                await test_basic_functionality()
+            elif choice == "2":
+                await test_error_handling()
+            elif choice == "3":
+                await test_structured_queries()
+            elif choice == "4":
+                await benchmark_performance()
+            elif choice == "5":
+                print("\n" + "="*50)
+                print("RUNNING COMPLETE TEST SUITE")
+                print("="*50)
+
+                # The groups are independent, so run them concurrently
+                all_passed = await run_groups(list(TEST_GROUPS.values()))
+
+                print(f"\n🎯 Overall Result: {'ALL TESTS PASSED' if all_passed else 'SOME TESTS FAILED'}")
+
+            elif choice == "6":
+                print("Goodbye! 👋")
+                break
+            else:
+                print("Invalid choice. Please select 1-6.")
 
-        if choice != "6":
-            input("\nPress Enter to continue...")
+            if choice != "6":
+                input("\nPress Enter to continue...")
+
+    finally:
+        await close_client()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    selected = args.all or any(getattr(args, name) for name in TEST_GROUPS)
+
     # Check for OpenAI API key
-    import os
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  Warning: OPENAI_API_KEY environment variable not set.")
         print("   The agent will still work with simulated data for testing.")
@@ -208,6 +399,9 @@ if __name__ == "__main__":
 
     # Run tests
     try:
+        if selected:
+            # Non-interactive run (e.g. CI): exit status reflects the result
+            sys.exit(0 if asyncio.run(_run_selected(args)) else 1)
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\n\nTest suite interrupted. Goodbye! 👋")